@@ -1,6 +1,37 @@
 # -*- encoding: utf-8 -*-
+from array import array
 from datetime import date, timedelta
-from typing import Tuple, Iterator
+import math
+import struct
+import sys
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    import sqlite3  # noqa: F401 (used in type comments only)
+
+_METHODS = ("cdc", "who")
+
+# Shared caches are never changed after they are published, and they are
+# replaced by a single assignment, so reading needs no lock (see warmup).
+_YEAR_STARTS = {}  # type: Dict[str, Tuple[int, ...]]
+_WEEKS = {}  # type: Dict[str, Dict[int, Tuple[Week, ...]]]
+_WARMUP_LOCK = threading.Lock()
+
+_DIGITS = frozenset("0123456789")
+
+_WEEKS_MAGIC = b"EPIW"
+_WEEKS_VERSION = 1
+_WEEKS_HEADER = struct.Struct("<4sBB2xI")
 
 
 class Week:
@@ -97,6 +128,13 @@ class Week:
     def __hash__(self):
         return hash((self.year, self.week, self.method))
 
+    def __reduce__(self):
+        key = self._year * 100 + self._week
+        packed = key * 2 + _method_code(self._method)
+        if type(self) is Week:
+            return _unpack_week, (packed,)
+        return _unpack_week, (packed, type(self)), self.__dict__
+
     @classmethod
     def fromdate(cls, date_obj, method="cdc"):
         # type : (date, str) -> Week
@@ -110,18 +148,9 @@ class Week:
         year, month, day = date_obj.year, date_obj.month, date_obj.day
         method = _check_method(method)
         date_ordinal = date(year, month, day).toordinal()
-        year_start_ordinal = _year_start(year, method)
-        week = (date_ordinal - year_start_ordinal) // 7
-        if week < 0:
-            year -= 1
-            year_start_ordinal = _year_start(year, method)
-            week = (date_ordinal - year_start_ordinal) // 7
-        elif week >= 52:
-            year_start_ordinal = _year_start(year + 1, method)
-            if date_ordinal >= year_start_ordinal:
-                year += 1
-                week = 0
-        week += 1
+        year, week = _epiweek(date_ordinal, year, method)
+        if cls is Week:
+            return _cached_week(year, week, method)
         return cls(year, week, method, validate=False)
 
     @classmethod
@@ -245,6 +274,12 @@ class Year:
         # type: () -> str
         return "{:04}".format(self._year)
 
+    def __reduce__(self):
+        packed = self._year * 2 + _method_code(self._method)
+        if type(self) is Year:
+            return _unpack_year, (packed,)
+        return _unpack_year, (packed, type(self)), self.__dict__
+
     @property
     def year(self):
         # type: () -> int
@@ -279,7 +314,755 @@ class Year:
         # type: ()  -> Iterator[Week]
         """Return an iterator that yield Week objects for all weeks of year."""
         for week in range(1, self.totalweeks + 1):
-            yield Week(self._year, week, self._method, validate=False)
+            yield _cached_week(self._year, week, self._method)
+
+
+class WeekSeries:
+    """A WeekSeries object stores a value for each week of a contiguous
+    range of weeks in epidemiological week calendar, using a compact array
+    of floats indexed by week offset from its start week. Missing values
+    are stored as ``nan``.
+    """
+
+    def __init__(self, start, values=()):
+        # type: (Week, Iterable[float]) -> None
+        """
+        :param start: first week of series
+        :type start: Week
+        :param values: values of consecutive weeks beginning with start week
+        :type values: Iterable[float]
+        """
+
+        if not isinstance(start, Week):
+            raise TypeError("start must be 'Week' object")
+        self._method = start.method
+        self._index = _week_index(start.year, start.week, self._method)
+        self._values = array("d", values)
+        _check_series_range(self._index, len(self._values), self._method)
+
+    def __repr__(self):
+        # type: () -> str
+        class_name = self.__class__.__name__
+        return "{}({!r}, {})".format(
+            class_name, self.start, self._values.tolist()
+        )
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._values)
+
+    def __iter__(self):
+        # type: () -> Iterator[Week]
+        return self.iterweeks()
+
+    def __contains__(self, other):
+        # type: (Week) -> bool
+        if not isinstance(other, Week):
+            raise TypeError("tested operand must be 'Week' object")
+        offset = self._offset(other)
+        return 0 <= offset < len(self._values)
+
+    def __getitem__(self, week):
+        # type: (Week) -> float
+        if not isinstance(week, Week):
+            raise TypeError("key must be 'Week' object")
+        offset = self._offset(week)
+        if not 0 <= offset < len(self._values):
+            raise KeyError(week)
+        return self._values[offset]
+
+    def __setitem__(self, week, value):
+        # type: (Week, float) -> None
+        if not isinstance(week, Week):
+            raise TypeError("key must be 'Week' object")
+        offset = self._offset(week)
+        if offset < 0:
+            self._values[0:0] = _nan_array(-offset)
+            self._index += offset
+            offset = 0
+        elif offset >= len(self._values):
+            self._values.extend(_nan_array(offset - len(self._values) + 1))
+        self._values[offset] = value
+
+    @classmethod
+    def fromdict(cls, data):
+        # type: (Dict[Week, float]) -> "WeekSeries"
+        """Construct WeekSeries object from a dictionary of values keyed by
+        Week objects, filling weeks with no values with ``nan``.
+
+        :param data: values keyed by Week objects
+        :type data: Dict[Week, float]
+        """
+
+        if not data:
+            raise ValueError("data must not be empty")
+        start = min(data)
+        series = cls(start, _nan_array(_week_offset(start, max(data)) + 1))
+        for week, value in data.items():
+            series[week] = value
+        return series
+
+    @classmethod
+    def fromdaily(cls, startdate, values, method="cdc"):
+        # type: (date, Iterable[float], str) -> "WeekSeries"
+        """Construct WeekSeries object by summing daily values into weeks.
+        Weeks at both ends of the series contain only the days given.
+
+        :param startdate: Gregorian date of first daily value
+        :type startdate: date
+        :param values: values of consecutive days beginning with startdate
+        :type values: Iterable[float]
+        :param method: calculation method, which may be ``cdc`` for MMWR weeks
+            or ``who`` for ISO weeks (default is ``cdc``)
+        :type method: str
+        """
+
+        method = _check_method(method)
+        date_ordinal = startdate.toordinal()
+        # days before first day of week of startdate
+        skip = (date_ordinal - 1 + _method_adjustment(method)) % 7
+        weekly = array("d")
+        total = 0.0
+        days = skip
+        pending = False
+        for value in values:
+            total += value
+            days += 1
+            pending = True
+            if days == 7:
+                weekly.append(total)
+                total = 0.0
+                days = 0
+                pending = False
+        if pending:
+            weekly.append(total)
+        index = (date_ordinal - skip) // 7
+        return cls._fromindex(index, method, weekly)
+
+    @classmethod
+    def _fromindex(cls, index, method, values):
+        # type: (int, str, Iterable[float]) -> "WeekSeries"
+        """Construct WeekSeries object from absolute index of start week."""
+        series = cls.__new__(cls)
+        series._method = method
+        series._index = index
+        series._values = array("d", values)
+        _check_series_range(index, len(series._values), method)
+        return series
+
+    @property
+    def start(self):
+        # type: () -> Week
+        """Return first week of series as a Week object"""
+        return _week_from_index(self._index, self._method)
+
+    @property
+    def end(self):
+        # type: () -> Week
+        """Return last week of series as a Week object"""
+        last_index = self._index + max(len(self._values) - 1, 0)
+        return _week_from_index(last_index, self._method)
+
+    @property
+    def method(self):
+        # type: () -> str
+        """Return calculation method as a string"""
+        return self._method
+
+    @property
+    def values(self):
+        # type: () -> array
+        """Return values of series as an array of floats, which is shared
+        with the series and can be wrapped without copying (e.g. by
+        ``memoryview`` or ``numpy.frombuffer``).
+        """
+        return self._values
+
+    def iterweeks(self):
+        # type: () -> Iterator[Week]
+        """Return an iterator that yield Week objects for all weeks of
+        series."""
+        for index in range(self._index, self._index + len(self._values)):
+            yield _week_from_index(index, self._method)
+
+    def items(self):
+        # type: () -> Iterator[Tuple[Week, float]]
+        """Return an iterator that yield (Week, value) pairs for all weeks
+        of series."""
+        return zip(self.iterweeks(), self._values)
+
+    def reindex(self, start, end):
+        # type: (Week, Week) -> "WeekSeries"
+        """Return new series covering weeks from start to end (inclusive),
+        filling weeks out of this series with ``nan``.
+
+        :param start: first week of new series
+        :type start: Week
+        :param end: last week of new series
+        :type end: Week
+        """
+
+        start_index = self._index + self._offset(start)
+        end_index = self._index + self._offset(end)
+        return self._reindex(start_index, end_index)
+
+    def align(self, other):
+        # type: ("WeekSeries") -> Tuple["WeekSeries", "WeekSeries"]
+        """Return both series reindexed over the union of their weeks.
+
+        :param other: series to align with
+        :type other: WeekSeries
+        """
+
+        if not isinstance(other, WeekSeries):
+            raise TypeError("second operand must be 'WeekSeries' object")
+        if other._method != self._method:
+            raise ValueError("series must use same calculation method")
+        if not other._values:
+            start_index = self._index
+            end_index = self._index + len(self._values) - 1
+        elif not self._values:
+            start_index = other._index
+            end_index = other._index + len(other._values) - 1
+        else:
+            start_index = min(self._index, other._index)
+            end_index = max(
+                self._index + len(self._values),
+                other._index + len(other._values),
+            ) - 1
+        return (
+            self._reindex(start_index, end_index),
+            other._reindex(start_index, end_index),
+        )
+
+    def shift(self, weeks):
+        # type: (int) -> "WeekSeries"
+        """Return new series with same values moved forward by given number
+        of weeks (or backward if negative).
+
+        :param weeks: number of weeks
+        :type weeks: int
+        """
+
+        if not isinstance(weeks, int):
+            raise TypeError("weeks must be an integer")
+        return self._fromindex(self._index + weeks, self._method, self._values)
+
+    def rolling_sum(self, window):
+        # type: (int) -> "WeekSeries"
+        """Return new series of sums over a rolling window of given number
+        of weeks ending at each week. Weeks with an incomplete window or
+        with a ``nan`` in window are ``nan``. Each window is summed
+        accurately on its own, which takes time proportional to length of
+        series times window.
+
+        :param window: number of weeks in window
+        :type window: int
+        """
+
+        window = _check_window(window)
+        values = self._values
+        result = _nan_array(len(values))
+        nans = 0
+        for i, value in enumerate(values):
+            if value != value:
+                nans += 1
+            if i >= window and values[i - window] != values[i - window]:
+                nans -= 1
+            if i >= window - 1 and not nans:
+                result[i] = _fsum(values[i - window + 1 : i + 1])
+        return self._fromindex(self._index, self._method, result)
+
+    def rolling_mean(self, window):
+        # type: (int) -> "WeekSeries"
+        """Return new series of means over a rolling window of given number
+        of weeks ending at each week. Weeks with an incomplete window or
+        with a ``nan`` in window are ``nan``. Like :meth:`rolling_sum`, it
+        takes time proportional to length of series times window.
+
+        :param window: number of weeks in window
+        :type window: int
+        """
+
+        sums = self.rolling_sum(window)
+        values = array("d", [value / window for value in sums._values])
+        return self._fromindex(self._index, self._method, values)
+
+    def _offset(self, week):
+        # type: (Week) -> int
+        """Return offset of week from start of series."""
+        if week.method != self._method:
+            raise ValueError("week must use same calculation method as series")
+        return _week_index(week.year, week.week, self._method) - self._index
+
+    def _reindex(self, start_index, end_index):
+        # type: (int, int) -> "WeekSeries"
+        """Return new series covering weeks from start to end indexes."""
+        length = max(end_index - start_index + 1, 0)
+        values = _nan_array(length)
+        lo = max(start_index, self._index)
+        hi = min(end_index + 1, self._index + len(self._values))
+        if lo < hi:
+            values[lo - start_index : hi - start_index] = self._values[
+                lo - self._index : hi - self._index
+            ]
+        return self._fromindex(start_index, self._method, values)
+
+
+class WeekClock:
+    """A WeekClock object tracks current week in epidemiological week
+    calendar using CDC or WHO calculation method. It keeps current Week
+    object with ordinals of its first and last days, and calculates a new
+    one only when current date moves out of that week.
+    """
+
+    def __init__(self, method="cdc", clock=date.today, on_rollover=None):
+        # type: (str, Callable[[], date], Optional[Callable[[Week, Week], None]]) -> None
+        """
+        :param method: calculation method, which may be ``cdc`` for MMWR weeks
+            or ``who`` for ISO weeks (default is ``cdc``)
+        :type method: str
+        :param clock: function that returns current date (default is
+            ``date.today``), which may be replaced for testing
+        :type clock: Callable[[], date]
+        :param on_rollover: function called with previous and new Week
+            objects when current week moves forward to a later week
+            (default is ``None``)
+        :type on_rollover: Callable[[Week, Week], None]
+        """
+
+        self._method = _check_method(method)
+        self._clock = clock
+        self._on_rollover = on_rollover
+        self._lock = threading.Lock()
+        self._current = self._calculate(clock())
+
+    def __repr__(self):
+        # type: () -> str
+        class_name = self.__class__.__name__
+        return "{}({})".format(class_name, self._method)
+
+    @property
+    def method(self):
+        # type: () -> str
+        """Return calculation method as a string"""
+        return self._method
+
+    def thisweek(self):
+        # type: () -> Week
+        """Return Week object of current date, which is the same object
+        until current date moves out of that week.
+        """
+        date_ordinal = self._clock().toordinal()
+        week, start_ordinal, end_ordinal = self._current
+        if start_ordinal <= date_ordinal <= end_ordinal:
+            return week
+        return self._rollover(date_ordinal)
+
+    def nextdate(self):
+        # type: () -> date
+        """Return date for first day of week after current week, when
+        rollover will happen.
+        """
+        return date.fromordinal(self._current[2] + 1)
+
+    def _rollover(self, date_ordinal):
+        # type: (int) -> Week
+        """Replace current week with week of given date ordinal, and call
+        rollover function if any when new week is later.
+        """
+        with self._lock:
+            previous = current = self._current
+            if not current[1] <= date_ordinal <= current[2]:
+                current = self._calculate(date.fromordinal(date_ordinal))
+                self._current = current
+        week = current[0]
+        # only moving forward is a rollover, not clock going back
+        if self._on_rollover is not None and current[1] > previous[1]:
+            self._on_rollover(previous[0], week)
+        return week
+
+    def _calculate(self, date_obj):
+        # type: (date) -> Tuple[Week, int, int]
+        """Return Week object of given date with ordinals of its first and
+        last days.
+        """
+        week = Week.fromdate(date_obj, self._method)
+        start_ordinal = _year_start(week.year, self._method) + (
+            (week.week - 1) * 7
+        )
+        return week, start_ordinal, start_ordinal + 6
+
+
+def warmup(years=(), methods=_METHODS):
+    # type: (Iterable[int], Iterable[str]) -> None
+    """Build shared caches ahead of time (e.g. at startup of a multi-threaded
+    service), which are tables of first days of years for given calculation
+    methods, and Week objects for all weeks of given years that are then
+    returned by :meth:`Week.fromdate` and :meth:`Year.iterweeks` instead of
+    new objects. Caches are safe to read from many threads without a lock.
+
+    :param years: epidemiological years of Week objects to cache (default
+        is none)
+    :type years: Iterable[int]
+    :param methods: calculation methods, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is both)
+    :type methods: Iterable[str]
+    """
+
+    years = [_check_year(year) for year in years]
+    methods = [_check_method(method) for method in methods]
+    with _WARMUP_LOCK:
+        for method in methods:
+            if method not in _YEAR_STARTS:
+                _build_year_starts(method)
+            if not years:
+                continue
+            # copy and replace, so readers never see a dict being changed
+            weeks_by_year = dict(_WEEKS.get(method, {}))
+            for year in years:
+                weeks_by_year[year] = tuple(
+                    Week(year, week, method, validate=False)
+                    for week in range(1, _year_total_weeks(year, method) + 1)
+                )
+            _WEEKS[method] = weeks_by_year
+
+
+def fromdates_dual(dates):
+    # type: (Iterable[date]) -> Tuple[array, array, array, array]
+    """Return epidemiological years and weeks of Gregorian dates using both
+    CDC and WHO calculation methods in a single pass, as arrays of
+    (cdc_years, cdc_weeks, who_years, who_weeks).
+
+    :param dates: Gregorian dates
+    :type dates: Iterable[date]
+    """
+
+    cdc_years, cdc_weeks = array("i"), array("i")
+    who_years, who_weeks = array("i"), array("i")
+    starts = {}  # type: Dict[int, Tuple[int, ...]]
+    for date_obj in dates:
+        year = date_obj.year
+        date_ordinal = date_obj.toordinal()
+        year_starts = starts.get(year)
+        if year_starts is None:
+            year_starts = _dual_year_starts(year)
+            starts[year] = year_starts
+        cdc_year, cdc_week = _epiweek_between(
+            date_ordinal, year, *year_starts[:3]
+        )
+        who_year, who_week = _epiweek_between(
+            date_ordinal, year, *year_starts[3:]
+        )
+        cdc_years.append(cdc_year)
+        cdc_weeks.append(cdc_week)
+        who_years.append(who_year)
+        who_weeks.append(who_week)
+    return cdc_years, cdc_weeks, who_years, who_weeks
+
+
+def shift_weeks(years, weeks, k, method="cdc"):
+    # type: (Iterable[int], Iterable[int], int, str) -> Tuple[array, array]
+    """Return epidemiological years and weeks of given weeks moved forward by
+    given number of weeks (or backward if negative), as arrays of
+    (years, weeks). Weeks are calculated from a table of year starts without
+    date objects.
+
+    :param years: epidemiological years
+    :type years: Iterable[int]
+    :param weeks: epidemiological weeks
+    :type weeks: Iterable[int]
+    :param k: number of weeks
+    :type k: int
+    :param method: calculation method, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is ``cdc``)
+    :type method: str
+    """
+
+    if not isinstance(k, int):
+        raise TypeError("k must be an integer")
+    method = _check_method(method)
+    year_starts = _year_starts(method)
+    new_years, new_weeks = array("i"), array("i")
+    for year, week in _zip_equal(years, weeks):
+        _check_table_week(year, week, year_starts)
+        week_start_ordinal = year_starts[year] + (week - 1 + k) * 7
+        year = _week_start_year(
+            week_start_ordinal, year + (week - 1 + k) // 53, year_starts
+        )
+        new_years.append(year)
+        new_weeks.append((week_start_ordinal - year_starts[year]) // 7 + 1)
+    return new_years, new_weeks
+
+
+def weeks_between(a_years, a_weeks, b_years, b_weeks, method="cdc"):
+    # type: (Iterable[int], Iterable[int], Iterable[int], Iterable[int], str) -> array
+    """Return numbers of weeks from weeks a to weeks b (negative if b is
+    before a) as an array. Weeks are calculated from a table of year starts
+    without date objects.
+
+    :param a_years: epidemiological years of weeks a
+    :type a_years: Iterable[int]
+    :param a_weeks: epidemiological weeks of weeks a
+    :type a_weeks: Iterable[int]
+    :param b_years: epidemiological years of weeks b
+    :type b_years: Iterable[int]
+    :param b_weeks: epidemiological weeks of weeks b
+    :type b_weeks: Iterable[int]
+    :param method: calculation method, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is ``cdc``)
+    :type method: str
+    """
+
+    method = _check_method(method)
+    year_starts = _year_starts(method)
+    differences = array("i")
+    for a_year, a_week, b_year, b_week in _zip_equal(
+        a_years, a_weeks, b_years, b_weeks
+    ):
+        _check_table_week(a_year, a_week, year_starts)
+        _check_table_week(b_year, b_week, year_starts)
+        weeks = (year_starts[b_year] - year_starts[a_year]) // 7
+        differences.append(weeks + b_week - a_week)
+    return differences
+
+
+def iter_days(start, end, method="cdc", ordinals=False):
+    # type: (date, date, str, bool) -> Iterator[Tuple]
+    """Return an iterator that yield (date, Week) tuples for all days from
+    start date to end date (inclusive), or (ordinal, year, week) tuples of
+    proleptic Gregorian ordinal and epidemiological year and week if
+    ordinals is ``True``. Week is calculated once for each week, so the same
+    Week object is yielded for all days of a week.
+
+    :param start: first Gregorian date
+    :type start: date
+    :param end: last Gregorian date
+    :type end: date
+    :param method: calculation method, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is ``cdc``)
+    :type method: str
+    :param ordinals: yield ordinals and integers instead of date and Week
+        objects (default is ``False``)
+    :type ordinals: bool
+    """
+
+    method = _check_method(method)
+    return _iter_days(start, end, method, ordinals)
+
+
+def iter_days_arrays(start, end, method="cdc", size=65536):
+    # type: (date, date, str, int) -> Iterator[Tuple[array, array, array]]
+    """Return an iterator that yield chunks of days from start date to end
+    date (inclusive) as (ordinals, years, weeks) arrays of integers with up
+    to given number of days, which can be wrapped without copying (e.g. by
+    ``numpy.frombuffer``).
+
+    :param start: first Gregorian date
+    :type start: date
+    :param end: last Gregorian date
+    :type end: date
+    :param method: calculation method, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is ``cdc``)
+    :type method: str
+    :param size: maximum number of days in each chunk (default is ``65536``)
+    :type size: int
+    """
+
+    if not isinstance(size, int):
+        raise TypeError("size must be an integer")
+    if size < 1:
+        raise ValueError("size must be a positive integer")
+    method = _check_method(method)
+    return _iter_days_arrays(start, end, method, size)
+
+
+def dumps_weeks(weeks, method="cdc"):
+    # type: (Iterable[Week], str) -> bytes
+    """Return Week objects serialized in a compact binary format, which is a
+    12-byte header (``EPIW`` magic, format version, method code of ``0`` for
+    ``cdc`` or ``1`` for ``who``, two padding bytes and little-endian
+    unsigned 32-bit count) followed by each week as a little-endian signed
+    32-bit integer of ``year * 100 + week``. Weeks can then be read without
+    parsing, e.g. with ``memoryview(data)[12:].cast("i")`` on little-endian
+    machines.
+
+    :param weeks: Week objects using given calculation method
+    :type weeks: Iterable[Week]
+    :param method: calculation method, which may be ``cdc`` for MMWR weeks
+        or ``who`` for ISO weeks (default is ``cdc``)
+    :type method: str
+    """
+
+    method = _check_method(method)
+    keys = array("i")
+    for week in weeks:
+        if week.method != method:
+            raise ValueError("weeks must use same calculation method")
+        keys.append(week.year * 100 + week.week)
+    if sys.byteorder != "little":
+        keys.byteswap()
+    header = _WEEKS_HEADER.pack(
+        _WEEKS_MAGIC, _WEEKS_VERSION, _method_code(method), len(keys)
+    )
+    return header + keys.tobytes()
+
+
+def loads_weeks(data):
+    # type: (bytes) -> List[Week]
+    """Return Week objects deserialized from binary format written by
+    :func:`dumps_weeks`.
+
+    :param data: serialized weeks
+    :type data: bytes
+    """
+
+    try:
+        magic, version, code, count = _WEEKS_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("invalid weeks data")
+    keys = array("i")
+    body = memoryview(data)[_WEEKS_HEADER.size :]
+    if (
+        magic != _WEEKS_MAGIC
+        or version != _WEEKS_VERSION
+        or code not in (0, 1)
+        or len(body) != count * keys.itemsize
+    ):
+        raise ValueError("invalid weeks data")
+    keys.frombytes(body)
+    if sys.byteorder != "little":
+        keys.byteswap()
+    method = _METHODS[code]
+    weeks = []
+    for key in keys:
+        year, week = divmod(key, 100)
+        if not _is_valid_week(year, week, method):
+            raise ValueError("invalid weeks data")
+        weeks.append(_cached_week(year, week, method))
+    return weeks
+
+
+def register_sqlite(connection):
+    # type: (sqlite3.Connection) -> None
+    """Register epidemiological week functions on a SQLite connection, so
+    that dates stored as ``YYYY-MM-DD`` text can be bucketed inside the
+    database (e.g. ``GROUP BY epiweek_key(onset)``).
+
+    The registered functions are ``epiyear(date[, method])``,
+    ``epiweek(date[, method])``, ``epiweek_key(date[, method])``, which
+    returns ``year * 100 + week`` as an integer, and
+    ``epiweek_start(year, week[, method])``, which returns start date of
+    week as ``YYYY-MM-DD`` text. Method defaults to ``cdc`` and ``NULL``
+    arguments return ``NULL``.
+
+    :param connection: SQLite database connection
+    :type connection: sqlite3.Connection
+    """
+
+    # name, number of arguments without optional method, and function
+    functions = [
+        ("epiyear", 1, lambda *args: _sqlite_epiweek(*args)[0]),
+        ("epiweek", 1, lambda *args: _sqlite_epiweek(*args)[1]),
+        ("epiweek_key", 1, lambda *args: _sqlite_epiweek(*args)[2]),
+        ("epiweek_start", 2, _sqlite_epiweek_start),
+    ]
+    for name, nargs, function in functions:
+        for narg in (nargs, nargs + 1):
+            try:
+                connection.create_function(
+                    name, narg, function, deterministic=True
+                )
+            except (TypeError, NotImplementedError):
+                # deterministic flag requires Python 3.8 and SQLite 3.8.3
+                connection.create_function(name, narg, function)
+
+
+def _sqlite_epiweek(date_text, method="cdc"):
+    # type: (str, str) -> Tuple[int, int, int]
+    """Return epidemiological (year, week, key) for date text in SQLite
+    function call.
+    """
+    if date_text is None or method is None:
+        return None, None, None
+    method = _check_method(method)
+    date_ordinal, year = _parse_date_text(date_text)
+    year, week = _epiweek(date_ordinal, year, method)
+    return year, week, year * 100 + week
+
+
+def _sqlite_epiweek_start(year, week, method="cdc"):
+    # type: (int, int, str) -> str
+    """Return start date text of week in SQLite function call."""
+    if year is None or week is None or method is None:
+        return None
+    year = _check_year(year)
+    method = _check_method(method)
+    week = _check_week(year, week, method)
+    week_start_ordinal = _year_start(year, method) + ((week - 1) * 7)
+    return date.fromordinal(week_start_ordinal).isoformat()
+
+
+def _parse_date_text(date_text):
+    # type: (str) -> Tuple[int, int]
+    """Return proleptic Gregorian ordinal and year of a date given as text
+    starting with ``YYYY-MM-DD`` (so that datetime text is accepted too).
+    """
+    if not isinstance(date_text, str):
+        raise TypeError("date must be a string")
+    fields = date_text[0:4], date_text[5:7], date_text[8:10]
+    if (
+        len(date_text) < 10
+        or date_text[4] != "-"
+        or date_text[7] != "-"
+        or date_text[10:11] not in ("", " ", "T")
+        or not all(set(field) <= _DIGITS for field in fields)
+    ):
+        raise ValueError("date must be in 'YYYY-MM-DD' format")
+    year, month, day = [int(field) for field in fields]
+    return date(year, month, day).toordinal(), year
+
+
+def _unpack_week(packed, cls=None):
+    # type: (int, Optional[type]) -> Week
+    """Return Week object (or object of given subclass) from integer packed
+    by ``Week.__reduce__``.
+    """
+    key, code = divmod(packed, 2)
+    year, week = divmod(key, 100)
+    method = _METHODS[code]
+    if not _is_valid_week(year, week, method):
+        raise ValueError("invalid packed week")
+    if cls is None:
+        return _cached_week(year, week, method)
+    # attributes of subclass objects are set from their pickled state
+    return cls.__new__(cls)
+
+
+def _unpack_year(packed, cls=None):
+    # type: (int, Optional[type]) -> Year
+    """Return Year object (or object of given subclass) from integer packed
+    by ``Year.__reduce__``.
+    """
+    year, code = divmod(packed, 2)
+    if cls is None:
+        return Year(year, _METHODS[code])
+    # attributes of subclass objects are set from their pickled state
+    return cls.__new__(cls)
+
+
+def _is_valid_week(year, week, method):
+    # type: (int, int, str) -> bool
+    """Return whether year and week are valid using given calculation
+    method.
+    """
+    return 1 <= year <= 9999 and 1 <= week <= _year_total_weeks(year, method)
+
+
+def _method_code(method):
+    # type: (str) -> int
+    """Return integer code of calculation method for serialization."""
+    return _METHODS.index(method)
 
 
 def _check_year(year):
@@ -303,15 +1086,24 @@ def _check_week(year, week, method):
     return week
 
 
+def _check_table_week(year, week, year_starts):
+    # type: (int, int, Tuple[int, ...]) -> None
+    """Check values of year and week using table of year starts."""
+    if not 1 <= year <= 9999:
+        raise ValueError("year must be in 1..9999")
+    weeks = (year_starts[year + 1] - year_starts[year]) // 7
+    if not 1 <= week <= weeks:
+        raise ValueError("week must be in 1..{} for year".format(weeks))
+
+
 def _check_method(method):
     # type: (str) -> str
     """Check type and value of calculation method."""
     if not isinstance(method, str):
         raise TypeError("method must be a string")
     method = method.lower()
-    methods = ["cdc", "who"]
-    if method not in methods:
-        raise ValueError("method must be '{}' or '{}'".format(*methods))
+    if method not in _METHODS:
+        raise ValueError("method must be '{}' or '{}'".format(*_METHODS))
     return method
 
 
@@ -329,20 +1121,79 @@ def _method_adjustment(method):
 def _year_start(year, method):
     # type: (int, str) -> int
     """Return proleptic Gregorian ordinal for first day of first week for
+    given year using given calculation method. Year 10000 is supported as
+    the year after the last valid year.
+    """
+    if not 1 <= year <= 10000:
+        raise ValueError("year {} is out of range".format(year))
+    return _year_starts(method)[year]
+
+
+def _year_starts(method):
+    # type: (str) -> Tuple[int, ...]
+    """Return table of ordinals for first day of first week for years
+    0..10000 using given calculation method, building it if needed.
+    """
+    year_starts = _YEAR_STARTS.get(method)
+    if year_starts is None:
+        year_starts = _build_year_starts(method)
+    return year_starts
+
+
+def _build_year_starts(method):
+    # type: (str) -> Tuple[int, ...]
+    """Build and return table of ordinals for first day of first week for
+    years 0..10000 using given calculation method. The table is a tuple that
+    is never changed after it is published to the shared cache by a single
+    assignment, so it is safe to read from many threads without a lock.
+    """
+    year_starts = tuple(
+        _calculate_year_start(year, method) for year in range(10001)
+    )
+    _YEAR_STARTS[method] = year_starts
+    return year_starts
+
+
+def _calculate_year_start(year, method):
+    # type: (int, str) -> int
+    """Calculate proleptic Gregorian ordinal for first day of first week for
     given year using given calculation method.
     """
 
     adjustment = _method_adjustment(method)
     mid_weekday = 3 - adjustment  # Sun is 6 .. Mon is 0
-    jan1 = date(year, 1, 1)
-    jan1_ordinal = jan1.toordinal()
-    jan1_weekday = jan1.weekday()
+    jan1_ordinal = _jan1_ordinal(year)
+    jan1_weekday = (jan1_ordinal + 6) % 7
     week1_start_ordinal = jan1_ordinal - jan1_weekday - adjustment
     if jan1_weekday > mid_weekday:
         week1_start_ordinal += 7
     return week1_start_ordinal
 
 
+def _jan1_ordinal(year):
+    # type: (int) -> int
+    """Return proleptic Gregorian ordinal for Jan 1 of given year, which is
+    calculated without a date object so that year 10000 is supported as the
+    year after the last valid year.
+    """
+    prev_year = year - 1
+    leap_days = prev_year // 4 - prev_year // 100 + prev_year // 400
+    return prev_year * 365 + leap_days + 1
+
+
+def _cached_week(year, week, method):
+    # type: (int, int, str) -> Week
+    """Return Week object from shared cache built by :func:`warmup`, or a
+    new Week object if its year is not cached.
+    """
+    weeks_by_year = _WEEKS.get(method)
+    if weeks_by_year is not None:
+        weeks = weeks_by_year.get(year)
+        if weeks is not None:
+            return weeks[week - 1]
+    return Week(year, week, method, validate=False)
+
+
 def _year_total_weeks(year, method):
     # type: (int, str) -> int
     """Return number of weeks in year for given year using given calculation
@@ -352,3 +1203,222 @@ def _year_total_weeks(year, method):
     next_year_start_ordinal = _year_start(year + 1, method)
     weeks = (next_year_start_ordinal - year_start_ordinal) // 7
     return weeks
+
+
+def _epiweek(date_ordinal, year, method):
+    # type: (int, int, str) -> Tuple[int, int]
+    """Return epidemiological (year, week) for given proleptic Gregorian
+    ordinal of a date that falls in given Gregorian year using given
+    calculation method.
+    """
+    year_start_ordinal = _year_start(year, method)
+    week = (date_ordinal - year_start_ordinal) // 7
+    if week < 0:
+        year -= 1
+        year_start_ordinal = _year_start(year, method)
+        week = (date_ordinal - year_start_ordinal) // 7
+    elif week >= 52:
+        year_start_ordinal = _year_start(year + 1, method)
+        if date_ordinal >= year_start_ordinal:
+            year += 1
+            week = 0
+    return year, week + 1
+
+
+def _dual_year_starts(year):
+    # type: (int) -> Tuple[int, int, int, int, int, int]
+    """Return proleptic Gregorian ordinals for first day of first week of
+    previous, given and next years using CDC and then WHO calculation
+    methods.
+    """
+    cdc_prev, who_prev = _week1_starts(year - 1)
+    cdc_start, who_start = _week1_starts(year)
+    cdc_next, who_next = _week1_starts(year + 1)
+    return cdc_prev, cdc_start, cdc_next, who_prev, who_start, who_next
+
+
+def _week1_starts(year):
+    # type: (int) -> Tuple[int, int]
+    """Return proleptic Gregorian ordinals for first day of first week for
+    given year using CDC and WHO calculation methods, sharing calculation of
+    ordinal and weekday of Jan 1 between both methods.
+    """
+    jan1_ordinal = _jan1_ordinal(year)
+    jan1_weekday = (jan1_ordinal + 6) % 7
+    cdc_start_ordinal = jan1_ordinal - jan1_weekday - 1
+    if jan1_weekday > 2:
+        cdc_start_ordinal += 7
+    who_start_ordinal = jan1_ordinal - jan1_weekday
+    if jan1_weekday > 3:
+        who_start_ordinal += 7
+    return cdc_start_ordinal, who_start_ordinal
+
+
+def _epiweek_between(date_ordinal, year, prev_start, start, next_start):
+    # type: (int, int, int, int, int) -> Tuple[int, int]
+    """Return epidemiological (year, week) for given proleptic Gregorian
+    ordinal of a date that falls in given Gregorian year, using ordinals for
+    first day of first week of previous, given and next years.
+    """
+    if date_ordinal < start:
+        return year - 1, (date_ordinal - prev_start) // 7 + 1
+    if date_ordinal >= next_start:
+        return year + 1, 1
+    return year, (date_ordinal - start) // 7 + 1
+
+
+def _week_index(year, week, method):
+    # type: (int, int, str) -> int
+    """Return absolute index of week, which increases by one for each week,
+    using given calculation method.
+    """
+    week_start_ordinal = _year_start(year, method) + ((week - 1) * 7)
+    return week_start_ordinal // 7
+
+
+def _week_from_index(index, method):
+    # type: (int, str) -> Week
+    """Return Week object for absolute index of week using given calculation
+    method.
+    """
+    week_start_ordinal = index * 7 + 1 - _method_adjustment(method)
+    year_starts = _year_starts(method)
+    year_guess = (week_start_ordinal * 400) // 146097 + 1
+    year = _week_start_year(week_start_ordinal, year_guess, year_starts)
+    week = (week_start_ordinal - year_starts[year]) // 7 + 1
+    return _cached_week(year, week, method)
+
+
+def _week_start_year(week_start_ordinal, year_guess, year_starts):
+    # type: (int, int, Tuple[int, ...]) -> int
+    """Return epidemiological year of week starting at given ordinal by
+    moving from a close guess of year using table of year starts.
+    """
+    year = min(max(year_guess, 1), 9999)
+    while year > 1 and year_starts[year] > week_start_ordinal:
+        year -= 1
+    while year < 9999 and year_starts[year + 1] <= week_start_ordinal:
+        year += 1
+    if not year_starts[year] <= week_start_ordinal < year_starts[year + 1]:
+        raise ValueError("week is out of range of years 1..9999")
+    return year
+
+
+def _week_offset(start, end):
+    # type: (Week, Week) -> int
+    """Return number of weeks from start week to end week."""
+    start_index = _week_index(start.year, start.week, start.method)
+    end_index = _week_index(end.year, end.week, end.method)
+    return end_index - start_index
+
+
+def _iter_days(start, end, method, ordinals):
+    # type: (date, date, str, bool) -> Iterator[Tuple]
+    """Return an iterator of days for :func:`iter_days`."""
+    for first, last, year, week in _iter_day_weeks(start, end, method):
+        if ordinals:
+            for date_ordinal in range(first, last + 1):
+                yield date_ordinal, year, week
+        else:
+            week_obj = _cached_week(year, week, method)
+            for date_ordinal in range(first, last + 1):
+                yield date.fromordinal(date_ordinal), week_obj
+
+
+def _iter_days_arrays(start, end, method, size):
+    # type: (date, date, str, int) -> Iterator[Tuple[array, array, array]]
+    """Return an iterator of chunks of days for :func:`iter_days_arrays`."""
+    ordinals, years, weeks = array("i"), array("i"), array("i")
+    for first, last, year, week in _iter_day_weeks(start, end, method):
+        while first <= last:
+            days = min(last - first + 1, size - len(ordinals))
+            ordinals.extend(range(first, first + days))
+            years.extend(array("i", [year]) * days)
+            weeks.extend(array("i", [week]) * days)
+            first += days
+            if len(ordinals) == size:
+                yield ordinals, years, weeks
+                ordinals, years, weeks = array("i"), array("i"), array("i")
+    if ordinals:
+        yield ordinals, years, weeks
+
+
+def _iter_day_weeks(start, end, method):
+    # type: (date, date, str) -> Iterator[Tuple[int, int, int, int]]
+    """Return an iterator that yield (first, last, year, week) tuples for
+    all weeks of days from start date to end date (inclusive), where first
+    and last are ordinals of first and last days of week within that range.
+    """
+    start_ordinal = start.toordinal()
+    end_ordinal = end.toordinal()
+    if start_ordinal > end_ordinal:
+        return
+    year, week = _epiweek(start_ordinal, start.year, method)
+    week_start_ordinal = _year_start(year, method) + ((week - 1) * 7)
+    total_weeks = _year_total_weeks(year, method)
+    first = start_ordinal
+    while True:
+        last = min(week_start_ordinal + 6, end_ordinal)
+        yield first, last, year, week
+        if last == end_ordinal:
+            return
+        week_start_ordinal += 7
+        first = week_start_ordinal
+        if week < total_weeks:
+            week += 1
+        else:
+            year += 1
+            week = 1
+            total_weeks = _year_total_weeks(year, method)
+
+
+def _zip_equal(*iterables):
+    # type: (*Iterable[int]) -> Iterator[Tuple[int, ...]]
+    """Return zip of iterables, raising error if they have different
+    lengths.
+    """
+    iterables = [list(iterable) for iterable in iterables]
+    if len(set(len(iterable) for iterable in iterables)) > 1:
+        raise ValueError("arrays must have same length")
+    return zip(*iterables)
+
+
+def _check_window(window):
+    # type: (int) -> int
+    """Check type and value of rolling window."""
+    if not isinstance(window, int):
+        raise TypeError("window must be an integer")
+    if window < 1:
+        raise ValueError("window must be a positive integer")
+    return window
+
+
+def _check_series_range(index, length, method):
+    # type: (int, int, str) -> None
+    """Check that series of given length starting at absolute index of week
+    lies within years 1..9999.
+    """
+    year_starts = _year_starts(method)
+    first_index = year_starts[1] // 7
+    last_index = (year_starts[10000] - 7) // 7
+    if index < first_index or index + max(length - 1, 0) > last_index:
+        raise ValueError("series is out of range of years 1..9999")
+
+
+def _fsum(values):
+    # type: (Iterable[float]) -> float
+    """Return accurate sum of values, which is ``nan`` if values contain
+    both positive and negative infinity, or infinity if it overflows.
+    """
+    try:
+        return math.fsum(values)
+    except ValueError:
+        return float("nan")
+    except OverflowError:
+        return sum(values)
+
+
+def _nan_array(length):
+    # type: (int) -> array
+    """Return array of floats of given length filled with nan."""
+    return array("d", [float("nan")]) * length
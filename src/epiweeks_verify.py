@@ -0,0 +1,345 @@
+# -*- encoding: utf-8 -*-
+"""Check all calculation engines of :mod:`epiweeks` against a reference
+calculation. Run as ``python -m epiweeks_verify``.
+"""
+import argparse
+from array import array
+from datetime import date
+import multiprocessing
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from epiweeks import (
+    _METHODS,
+    Week,
+    _check_year,
+    _dual_year_starts,
+    _epiweek,
+    _jan1_ordinal,
+    _week_from_index,
+    _year_start,
+    _year_total_weeks,
+    fromdates_dual,
+    iter_days_arrays,
+    shift_weeks,
+    weeks_between,
+)
+
+
+def verify(start_year=1, end_year=9999, processes=None):
+    # type: (int, int, Optional[int]) -> List[Tuple[str, str, str, object]]
+    """Check that every calculation engine of :mod:`epiweeks` agrees with a
+    reference calculation for all dates and weeks of given range of years
+    using both calculation methods. The reference assigns each week to the
+    year of its middle day (Wednesday for ``cdc`` and Thursday for ``who``).
+
+    Return first mismatch found for each engine and method in each chunk of
+    years as (check, engine, method, value) tuples, where check is
+    ``fromdate`` with a date value, ``startdate`` with a Week value, or
+    ``shift`` with a (Week, weeks) value of first week of a year and number
+    of weeks it is shifted by, so an empty list means that all engines
+    agree.
+
+    :param start_year: first Gregorian year to check (default is ``1``)
+    :type start_year: int
+    :param end_year: last Gregorian year to check (default is ``9999``)
+    :type end_year: int
+    :param processes: number of worker processes to check chunks of years
+        in parallel (default is number of CPUs), or ``1`` to check them in
+        current process
+    :type processes: int
+    """
+
+    start_year = _check_year(start_year)
+    end_year = _check_year(end_year)
+    chunks = [
+        (year, min(year + _VERIFY_CHUNK_YEARS - 1, end_year))
+        for year in range(start_year, end_year + 1, _VERIFY_CHUNK_YEARS)
+    ]
+    if processes == 1:
+        results = [_verify_years(chunk) for chunk in chunks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_verify_years, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    return [mismatch for result in results for mismatch in result]
+
+
+def _verify_years(years):
+    # type: (Tuple[int, int]) -> List[Tuple[str, str, str, object]]
+    """Return mismatches of all engines for given (first, last) years."""
+    first_year, last_year = years
+    first_ordinal = _jan1_ordinal(first_year)
+    stop_ordinal = _jan1_ordinal(last_year + 1)
+    engine_keys = [
+        (engine, function(first_year, last_year))
+        for engine, function in sorted(_FROMDATE_ENGINES.items())
+    ]
+    mismatches = []
+    for method in _METHODS:
+        reference = _reference_keys(first_ordinal, stop_ordinal, method)
+        for engine, keys_by_method in engine_keys:
+            keys = keys_by_method[method]
+            if keys != reference:
+                offset = _first_difference(keys, reference)
+                value = date.fromordinal(first_ordinal + offset)
+                mismatches.append(("fromdate", engine, method, value))
+        for engine, function in sorted(_STARTDATE_ENGINES.items()):
+            for year in range(first_year, last_year + 1):
+                starts = function(year, method)
+                reference_starts = _reference_week_starts(year, method)
+                if starts != reference_starts:
+                    week = _first_difference(starts, reference_starts) + 1
+                    value = Week(year, week, method, validate=False)
+                    mismatches.append(("startdate", engine, method, value))
+                    break
+        mismatches.extend(_verify_shifts(first_year, last_year, method))
+    return mismatches
+
+
+def _verify_shifts(first_year, last_year, method):
+    # type: (int, int, str) -> List[Tuple[str, str, str, object]]
+    """Return mismatches of ``shift_weeks`` and ``weeks_between`` for first
+    week of each of given years shifted by -60..110 weeks, which crosses
+    boundaries of both 52-week and 53-week years.
+    """
+    mismatches = []
+    failed = set()
+    # reference keys of weeks by ordinals of their first days, for all
+    # years that shifted weeks may fall in
+    reference = {}
+    for year in range(max(first_year - 2, 1), min(last_year + 3, 9999) + 1):
+        starts = _reference_week_starts(year, method)
+        for week, week_start_ordinal in enumerate(starts, 1):
+            reference[week_start_ordinal] = year * 100 + week
+    first_starts = [
+        (year, _reference_week_starts(year, method)[0])
+        for year in range(first_year, last_year + 1)
+    ]
+    for k in range(-60, 111):
+        years = array("i")
+        keys = array("i")
+        for year, week_start_ordinal in first_starts:
+            key = reference.get(week_start_ordinal + (k * 7))
+            if key is not None:
+                years.append(year)
+                keys.append(key)
+        if not years:
+            continue
+        ones = [1] * len(years)
+        shifted_years, shifted_weeks = shift_weeks(years, ones, k, method)
+        shifted_keys = [
+            year * 100 + week
+            for year, week in zip(shifted_years, shifted_weeks)
+        ]
+        key_years = [key // 100 for key in keys]
+        key_weeks = [key % 100 for key in keys]
+        counts = weeks_between(years, ones, key_years, key_weeks, method)
+        results = [
+            ("shift_weeks", shifted_keys, keys),
+            ("weeks_between", counts, [k] * len(years)),
+        ]
+        for engine, values, expected in results:
+            if engine not in failed and list(values) != list(expected):
+                index = _first_difference(values, expected)
+                week = Week(years[index], 1, method, validate=False)
+                mismatches.append(("shift", engine, method, (week, k)))
+                failed.add(engine)
+    return mismatches
+
+
+def _reference_keys(first_ordinal, stop_ordinal, method):
+    # type: (int, int, str) -> array
+    """Return ``year * 100 + week`` for proleptic Gregorian ordinals from
+    first to stop (exclusive) using given calculation method, calculating
+    reference once for each week and repeating it for its days.
+    """
+    keys = array("i")
+    date_ordinal = first_ordinal
+    while date_ordinal < stop_ordinal:
+        key = _reference_epiweek(date_ordinal, method)
+        # weeks start on ordinals divisible by 7 (Sunday) for cdc, or one
+        # more than that (Monday) for who
+        first_ordinal_offset = 0 if method == "cdc" else 1
+        days = 7 - (date_ordinal - first_ordinal_offset) % 7
+        days = min(days, stop_ordinal - date_ordinal)
+        keys.extend(array("i", [key]) * days)
+        date_ordinal += days
+    return keys
+
+
+def _reference_epiweek(date_ordinal, method):
+    # type: (int, str) -> int
+    """Return ``year * 100 + week`` for given proleptic Gregorian ordinal
+    using given calculation method, by finding the year of the middle day of
+    its week and counting weeks from the first middle day of that year.
+    """
+    first_weekday = 6 if method == "cdc" else 0
+    weekday = date.fromordinal(date_ordinal).weekday()
+    week_start_ordinal = date_ordinal - (weekday - first_weekday) % 7
+    middle = date.fromordinal(week_start_ordinal + 3)
+    jan1_ordinal = date(middle.year, 1, 1).toordinal()
+    week = (middle.toordinal() - jan1_ordinal) // 7 + 1
+    return middle.year * 100 + week
+
+
+def _reference_week_starts(year, method):
+    # type: (int, str) -> List[int]
+    """Return proleptic Gregorian ordinals for first days of all weeks of
+    given year using given calculation method, which are three days before
+    middle days (Wednesday or Thursday) falling in that year.
+    """
+    middle_weekday = 2 if method == "cdc" else 3
+    jan1 = date(year, 1, 1)
+    days_to_middle = (middle_weekday - jan1.weekday()) % 7
+    first_middle_ordinal = jan1.toordinal() + days_to_middle
+    dec31_ordinal = date(year, 12, 31).toordinal()
+    middles = range(first_middle_ordinal, dec31_ordinal + 1, 7)
+    return [middle_ordinal - 3 for middle_ordinal in middles]
+
+
+def _first_difference(values, other_values):
+    # type: (Iterable[int], Iterable[int]) -> int
+    """Return index of first difference between two sequences."""
+    for index, (value, other_value) in enumerate(zip(values, other_values)):
+        if value != other_value:
+            return index
+    return min(len(values), len(other_values))
+
+
+def _scalar_fromdate_keys(first_year, last_year):
+    # type: (int, int) -> Dict[str, array]
+    """Return ``year * 100 + week`` for all dates of given years by method
+    using scalar calculation of ``Week.fromdate``.
+    """
+    keys_by_method = {}
+    for method in _METHODS:
+        keys = array("i")
+        for year in range(first_year, last_year + 1):
+            ordinals = range(_jan1_ordinal(year), _jan1_ordinal(year + 1))
+            for date_ordinal in ordinals:
+                epi_year, week = _epiweek(date_ordinal, year, method)
+                keys.append(epi_year * 100 + week)
+        keys_by_method[method] = keys
+    return keys_by_method
+
+
+def _dual_fromdate_keys(first_year, last_year):
+    # type: (int, int) -> Dict[str, array]
+    """Return ``year * 100 + week`` for all dates of given years by method
+    using a single call of ``fromdates_dual``.
+    """
+    ordinals = range(_jan1_ordinal(first_year), _jan1_ordinal(last_year + 1))
+    results = fromdates_dual(date.fromordinal(o) for o in ordinals)
+    return {
+        "cdc": _keys(*results[:2]),
+        "who": _keys(*results[2:]),
+    }
+
+
+def _days_fromdate_keys(first_year, last_year):
+    # type: (int, int) -> Dict[str, array]
+    """Return ``year * 100 + week`` for all dates of given years by method
+    using ``iter_days_arrays``.
+    """
+    start = date(first_year, 1, 1)
+    end = date(last_year, 12, 31)
+    keys_by_method = {}
+    for method in _METHODS:
+        keys = array("i")
+        for _, years, weeks in iter_days_arrays(start, end, method):
+            keys.extend(_keys(years, weeks))
+        keys_by_method[method] = keys
+    return keys_by_method
+
+
+def _keys(years, weeks):
+    # type: (Iterable[int], Iterable[int]) -> array
+    """Return ``year * 100 + week`` for given years and weeks."""
+    return array("i", [year * 100 + week for year, week in zip(years, weeks)])
+
+
+def _scalar_week_starts(year, method):
+    # type: (int, str) -> List[int]
+    """Return ordinals for first days of all weeks of given year using
+    scalar calculation of ``Week.startdate``.
+    """
+    year_start_ordinal = _year_start(year, method)
+    weeks = range(_year_total_weeks(year, method))
+    return [year_start_ordinal + (week * 7) for week in weeks]
+
+
+def _dual_week_starts(year, method):
+    # type: (int, str) -> List[int]
+    """Return ordinals for first days of all weeks of given year using year
+    starts of ``fromdates_dual``.
+    """
+    year_starts = _dual_year_starts(year)
+    if method == "who":
+        year_starts = year_starts[3:]
+    return list(range(year_starts[1], year_starts[2], 7))
+
+
+def _index_week_starts(year, method):
+    # type: (int, str) -> List[Optional[int]]
+    """Return ordinals for first days of all weeks of given year by
+    converting first day of each week near that year to absolute index of
+    week and back to a Week object with ``_week_from_index``, ordered by
+    week numbers of that year.
+    """
+    first_ordinal_offset = 0 if method == "cdc" else 1
+    starts_by_week = {}
+    # weeks of year start from three days before to four days after Jan 1
+    for week_start_ordinal in range(
+        _jan1_ordinal(year) - 3, _jan1_ordinal(year + 1) - 3
+    ):
+        if week_start_ordinal % 7 != first_ordinal_offset:
+            continue
+        week = _week_from_index(week_start_ordinal // 7, method)
+        if week.year == year:
+            starts_by_week[week.week] = week_start_ordinal
+    weeks = range(1, len(starts_by_week) + 1)
+    return [starts_by_week.get(week) for week in weeks]
+
+
+_FROMDATE_ENGINES = {
+    "scalar": _scalar_fromdate_keys,
+    "dual": _dual_fromdate_keys,
+    "days": _days_fromdate_keys,
+}
+
+_STARTDATE_ENGINES = {
+    "scalar": _scalar_week_starts,
+    "dual": _dual_week_starts,
+    "index": _index_week_starts,
+}
+
+_VERIFY_CHUNK_YEARS = 100
+
+
+def _main(argv=None):
+    # type: (Optional[List[str]]) -> int
+    """Run command line interface and return exit status."""
+    parser = argparse.ArgumentParser(
+        prog="python -m epiweeks_verify",
+        description="Check all calculation engines of epiweeks against "
+        "reference calculation for all dates of given years.",
+    )
+    parser.add_argument("--start-year", type=int, default=1)
+    parser.add_argument("--end-year", type=int, default=9999)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+    mismatches = verify(args.start_year, args.end_year, args.processes)
+    for check, engine, method, value in mismatches:
+        message = "{} mismatch: {} engine, {} method, {!r}"
+        print(message.format(check, engine, method, value))
+    message = "{} mismatches in years {}..{}"
+    print(message.format(len(mismatches), args.start_year, args.end_year))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,32 @@
+import threading
+import time
+from datetime import date, timedelta
+import epiweeks
+
+
+def test_throughput_from_many_threads():
+    dates = [date(2010, 1, 1) + timedelta(days=d) for d in range(5000)]
+    epiweeks.warmup(range(2010, 2025))
+    expected = [epiweeks.Week.fromdate(d, "who") for d in dates]
+    errors = []
+
+    def worker():
+        for date_obj, week in zip(dates, expected):
+            if epiweeks.Week.fromdate(date_obj, "who") != week:
+                errors.append(date_obj)
+            epiweeks.Week(week.year, week.week, "who")
+
+    started = time.time()
+    worker()
+    baseline = len(dates) / (time.time() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    throughput = len(threads) * len(dates) / (time.time() - started)
+    assert errors == []
+    # lookups must not serialize on a lock, so threads keep up with one
+    assert throughput > baseline / 2
@@ -0,0 +1,5 @@
+import epiweeks_verify
+
+
+def test_all_engines_for_all_dates():
+    assert epiweeks_verify.verify(1, 9999) == []
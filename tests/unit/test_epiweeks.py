@@ -1,6 +1,7 @@
 import pytest
 from datetime import date, timedelta
 import epiweeks as epi
+import epiweeks_verify
 
 
 @pytest.mark.parametrize(
@@ -287,3 +288,605 @@ def test_year_start_ordinal(test_input, expected):
 )
 def test_year_total_weeks(test_input, expected):
     assert epi._year_total_weeks(*test_input) == expected
+
+
+@pytest.fixture
+def sqlite_connection():
+    import sqlite3
+
+    connection = sqlite3.connect(":memory:")
+    epi.register_sqlite(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    "test_input, expected",
+    [
+        (("2014-12-28",), (2014, 53, 201453)),
+        (("2014-12-28", "who"), (2014, 52, 201452)),
+        (("2015-01-02", "cdc"), (2014, 53, 201453)),
+        (("2015-01-02", "WHO"), (2015, 1, 201501)),
+        (("2017-12-31 10:30:00",), (2018, 1, 201801)),
+        ((None,), (None, None, None)),
+    ],
+)
+def test_sqlite_epiweek_functions(sqlite_connection, test_input, expected):
+    args = ", ".join("?" for _ in test_input)
+    query = "SELECT epiyear({0}), epiweek({0}), epiweek_key({0})"
+    row = sqlite_connection.execute(query.format(args), test_input * 3)
+    assert row.fetchone() == expected
+
+
+def test_sqlite_epiweek_start(sqlite_connection):
+    query = "SELECT epiweek_start(2015, 1), epiweek_start(2015, 1, 'who')"
+    row = sqlite_connection.execute(query).fetchone()
+    assert row == ("2015-01-04", "2014-12-29")
+
+
+def test_sqlite_group_by_epiweek_key(sqlite_connection):
+    sqlite_connection.execute("CREATE TABLE cases (onset TEXT)")
+    onsets = ["2015-01-03", "2015-01-04", "2015-01-10", "2015-01-11"]
+    sqlite_connection.executemany(
+        "INSERT INTO cases VALUES (?)", [(onset,) for onset in onsets]
+    )
+    query = (
+        "SELECT epiweek_key(onset), COUNT(*) FROM cases "
+        "GROUP BY epiweek_key(onset) ORDER BY 1"
+    )
+    rows = sqlite_connection.execute(query).fetchall()
+    assert rows == [(201453, 1), (201501, 2), (201502, 1)]
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        "2015/01/02",
+        "+015-01-05",
+        "2015- 1-05",
+        "2015-01-5",
+        "2015-01-051",
+        "2015-01-\u0665\u0665",
+        "2015-02-30",
+    ],
+)
+def test_sqlite_invalid_date(sqlite_connection, test_input):
+    import sqlite3
+
+    with pytest.raises(sqlite3.OperationalError):
+        query = "SELECT epiweek(?)"
+        sqlite_connection.execute(query, (test_input,)).fetchone()
+
+
+@pytest.mark.parametrize(
+    "test_input", ["2015-01-05", "2015-01-05 10:30", "2015-01-05T10:30"]
+)
+def test_parse_date_text(test_input):
+    assert epi._parse_date_text(test_input) == (735603, 2015)
+
+
+def assert_series_equal(series, start, values):
+    assert series.start == start
+    assert len(series) == len(values)
+    for actual, expected in zip(series.values, values):
+        if expected != expected:
+            assert actual != actual
+        else:
+            assert actual == expected
+
+
+@pytest.fixture
+def series_cdc():
+    return epi.WeekSeries(epi.Week(2014, 52), [1, 2, 3, 4])
+
+
+def test_series_representation(series_cdc):
+    expected = "WeekSeries(Week(2014, 52, cdc), [1.0, 2.0, 3.0, 4.0])"
+    assert series_cdc.__repr__() == expected
+
+
+def test_series_weeks(series_cdc):
+    weeks = [epi.Week(2014, 52), epi.Week(2014, 53)]
+    weeks += [epi.Week(2015, 1), epi.Week(2015, 2)]
+    assert list(series_cdc) == weeks
+    assert series_cdc.start == weeks[0]
+    assert series_cdc.end == weeks[-1]
+    assert series_cdc.method == "cdc"
+
+
+def test_series_get_item(series_cdc):
+    assert series_cdc[epi.Week(2015, 1)] == 3
+    assert epi.Week(2015, 2) in series_cdc
+    assert epi.Week(2015, 3) not in series_cdc
+    with pytest.raises(KeyError):
+        series_cdc[epi.Week(2015, 3)]
+
+
+def test_series_set_item(series_cdc):
+    series = epi.WeekSeries(series_cdc.start, series_cdc.values)
+    series[epi.Week(2015, 1)] = 10
+    series[epi.Week(2015, 4)] = 20
+    series[epi.Week(2014, 51)] = 30
+    nan = float("nan")
+    expected = [30, 1, 2, 10, 4, nan, 20]
+    assert_series_equal(series, epi.Week(2014, 51), expected)
+
+
+def test_series_method_mismatch(series_cdc):
+    with pytest.raises(ValueError) as e:
+        series_cdc[epi.Week(2015, 1, "who")]
+    assert str(e.value) == "week must use same calculation method as series"
+
+
+def test_series_from_dict():
+    data = {epi.Week(2015, 53, "who"): 1, epi.Week(2016, 2, "who"): 2}
+    series = epi.WeekSeries.fromdict(data)
+    nan = float("nan")
+    assert_series_equal(series, epi.Week(2015, 53, "who"), [1, nan, 2])
+
+
+@pytest.mark.parametrize(
+    "test_input, expected",
+    [
+        ((date(2015, 1, 1), "cdc"), (epi.Week(2014, 53), [3, 7, 4])),
+        ((date(2015, 1, 1), "who"), (epi.Week(2015, 1, "who"), [4, 7, 3])),
+        ((date(2015, 1, 4), "cdc"), (epi.Week(2015, 1), [7, 7])),
+    ],
+)
+def test_series_from_daily(test_input, expected):
+    startdate, method = test_input
+    series = epi.WeekSeries.fromdaily(startdate, [1] * 14, method)
+    assert_series_equal(series, *expected)
+    for week, value in series.items():
+        days = [d for d in week.iterdates() if d >= startdate]
+        assert value == len([d for d in days if (d - startdate).days < 14])
+
+
+def test_series_reindex(series_cdc):
+    series = series_cdc.reindex(epi.Week(2015, 1), epi.Week(2015, 4))
+    nan = float("nan")
+    assert_series_equal(series, epi.Week(2015, 1), [3, 4, nan, nan])
+
+
+def test_series_align(series_cdc):
+    other = epi.WeekSeries(epi.Week(2015, 2), [5, 6])
+    left, right = series_cdc.align(other)
+    nan = float("nan")
+    assert_series_equal(left, epi.Week(2014, 52), [1, 2, 3, 4, nan])
+    assert_series_equal(right, epi.Week(2014, 52), [nan, nan, nan, 5, 6])
+
+
+def test_series_align_method_mismatch(series_cdc):
+    other = epi.WeekSeries(epi.Week(2015, 2, "who"), [5, 6])
+    with pytest.raises(ValueError) as e:
+        series_cdc.align(other)
+    assert str(e.value) == "series must use same calculation method"
+
+
+def test_series_shift(series_cdc):
+    series = series_cdc.shift(2)
+    assert_series_equal(series, epi.Week(2014, 52) + 2, [1, 2, 3, 4])
+    assert series.start == epi.Week(2015, 1)
+
+
+@pytest.mark.parametrize("method", ["cdc", "who"])
+def test_series_shift_out_of_range(method):
+    series = epi.WeekSeries(epi.Week(2015, 1, method), [1, 2])
+    with pytest.raises(ValueError):
+        series.shift(10 ** 6)
+    with pytest.raises(ValueError):
+        series.shift(-(10 ** 6))
+    last_week = epi.Week(9999, epi.Year(9999, method).totalweeks, method)
+    series = epi.WeekSeries(last_week - 1, [1, 2])
+    assert series.end == last_week
+    with pytest.raises(ValueError):
+        series.shift(1)
+    series = epi.WeekSeries(epi.Week(1, 1, method), [1])
+    with pytest.raises(ValueError):
+        series.shift(-1)
+    with pytest.raises(ValueError):
+        epi.WeekSeries(last_week, [1, 2])
+
+
+def test_series_rolling(series_cdc):
+    nan = float("nan")
+    start = series_cdc.start
+    assert_series_equal(series_cdc.rolling_sum(2), start, [nan, 3, 5, 7])
+    expected = [nan, nan, 2, 3]
+    assert_series_equal(series_cdc.rolling_mean(3), start, expected)
+
+
+def test_series_rolling_with_nan():
+    nan = float("nan")
+    series = epi.WeekSeries(epi.Week(2015, 1), [1, nan, 3, 4, 5])
+    expected = [nan, nan, nan, 7, 9]
+    assert_series_equal(series.rolling_sum(2), epi.Week(2015, 1), expected)
+
+
+def test_week1_starts():
+    for year in range(1990, 2040):
+        expected = (epi._year_start(year, "cdc"), epi._year_start(year, "who"))
+        assert epi._week1_starts(year) == expected
+
+
+def test_fromdates_dual():
+    startdate = date(2014, 12, 1)
+    dates = [startdate + timedelta(days=d) for d in range(1200)]
+    cdc_years, cdc_weeks, who_years, who_weeks = epi.fromdates_dual(dates)
+    for i, date_obj in enumerate(dates):
+        cdc_week = epi.Week.fromdate(date_obj, "cdc")
+        who_week = epi.Week.fromdate(date_obj, "who")
+        assert (cdc_years[i], cdc_weeks[i]) == cdc_week.weektuple()
+        assert (who_years[i], who_weeks[i]) == who_week.weektuple()
+
+
+def test_fromdates_dual_empty():
+    assert [list(a) for a in epi.fromdates_dual([])] == [[], [], [], []]
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        epi.Week(2015, 53, "who"),
+        epi.Week(2015, 1),
+        epi.Year(2015),
+        epi.Year(2015, "who"),
+    ],
+)
+def test_pickle(test_input):
+    import pickle
+
+    loaded = pickle.loads(pickle.dumps(test_input))
+    assert type(loaded) is type(test_input)
+    assert repr(loaded) == repr(test_input)
+
+
+def test_pickle_is_compact():
+    import pickle
+
+    weeks = list(epi.Year(2015).iterweeks())
+    assert len(pickle.dumps(weeks)) < 20 * len(weeks)
+
+
+@pytest.mark.parametrize("test_input", ["cdc", "who"])
+def test_dumps_and_loads_weeks(test_input):
+    weeks = list(epi.Year(2015, test_input).iterweeks())
+    data = epi.dumps_weeks(weeks, test_input)
+    assert len(data) == 12 + 4 * len(weeks)
+    loaded = epi.loads_weeks(data)
+    assert [repr(w) for w in loaded] == [repr(w) for w in weeks]
+
+
+def test_dumps_weeks_format():
+    data = epi.dumps_weeks([epi.Week(2015, 1, "who")], "who")
+    assert data == b"EPIW\x01\x01\x00\x00\x01\x00\x00\x00\x1d\x13\x03\x00"
+
+
+def test_dumps_weeks_method_mismatch():
+    with pytest.raises(ValueError) as e:
+        epi.dumps_weeks([epi.Week(2015, 1, "who")])
+    assert str(e.value) == "weeks must use same calculation method"
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        b"",
+        b"EPIX\x01\x00\x00\x00\x00\x00\x00\x00",
+        b"EPIW\x01\x00\x00\x00\x02\x00\x00\x00\x1d\x13\x03\x00",
+    ],
+)
+def test_loads_invalid_weeks(test_input):
+    with pytest.raises(ValueError) as e:
+        epi.loads_weeks(test_input)
+    assert str(e.value) == "invalid weeks data"
+
+
+@pytest.fixture
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(epi, "_YEAR_STARTS", {})
+    monkeypatch.setattr(epi, "_WEEKS", {})
+
+
+def test_warmup(empty_caches):
+    epi.warmup([2015], ["who"])
+    assert list(epi._YEAR_STARTS) == ["who"]
+    assert len(epi._WEEKS["who"][2015]) == 53
+    week = epi.Week.fromdate(date(2015, 1, 1), "who")
+    assert week is epi._WEEKS["who"][2015][0]
+    assert list(epi.Year(2015, "who").iterweeks())[0] is week
+    assert epi.Week.fromdate(date(2016, 1, 4), "who") == epi.Week(2016, 1)
+
+
+def test_warmup_keeps_cached_years(empty_caches):
+    epi.warmup([2015], ["cdc"])
+    weeks = epi._WEEKS["cdc"]
+    epi.warmup([2016], ["cdc"])
+    assert sorted(epi._WEEKS["cdc"]) == [2015, 2016]
+    assert sorted(weeks) == [2015]
+
+
+def test_caches_from_many_threads(empty_caches):
+    import threading
+
+    dates = [date(2010, 1, 1) + timedelta(days=d) for d in range(0, 5000, 3)]
+    expected = [
+        (epiweeks_verify._reference_epiweek(d.toordinal(), m), d, m)
+        for d in dates
+        for m in ("cdc", "who")
+    ]
+    errors = []
+
+    def worker(warm):
+        if warm:
+            epi.warmup(range(2010, 2024))
+        for key, date_obj, method in expected:
+            week = epi.Week.fromdate(date_obj, method)
+            if week.year * 100 + week.week != key:
+                errors.append((date_obj, method, week))
+            if epi.Week(week.year, week.week, method) != week:
+                errors.append((date_obj, method, week))
+
+    threads = [
+        threading.Thread(target=worker, args=(i % 4 == 0,)) for i in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+@pytest.mark.parametrize("test_input", ["cdc", "who"])
+def test_shift_weeks(test_input):
+    weeks = list(epi.Year(2014, test_input).iterweeks())
+    weeks += list(epi.Year(2015, test_input).iterweeks())
+    years = [w.year for w in weeks]
+    numbers = [w.week for w in weeks]
+    for k in (-60, -53, -1, 0, 1, 52, 53, 110):
+        shifted = epi.shift_weeks(years, numbers, k, test_input)
+        expected = [(w + k).weektuple() for w in weeks]
+        assert list(zip(*shifted)) == expected
+
+
+def test_shift_weeks_out_of_range():
+    with pytest.raises(ValueError) as e:
+        epi.shift_weeks([9999], [52], 1)
+    assert str(e.value) == "week is out of range of years 1..9999"
+
+
+@pytest.mark.parametrize("test_input", [(2015, 53), (2015, 0), (2015, -1)])
+def test_shift_weeks_invalid_week(test_input):
+    year, week = test_input
+    with pytest.raises(ValueError) as e:
+        epi.shift_weeks([year], [week], 0)
+    assert str(e.value) == "week must be in 1..52 for year"
+
+
+@pytest.mark.parametrize("test_input", ["cdc", "who"])
+def test_weeks_between(test_input):
+    a = epi.Week(2014, 50, test_input)
+    b = [a + k for k in range(-70, 70)]
+    differences = epi.weeks_between(
+        [a.year] * len(b),
+        [a.week] * len(b),
+        [w.year for w in b],
+        [w.week for w in b],
+        test_input,
+    )
+    assert list(differences) == list(range(-70, 70))
+
+
+def test_weeks_between_different_lengths():
+    with pytest.raises(ValueError) as e:
+        epi.weeks_between([2015], [1], [2015, 2016], [1, 1])
+    assert str(e.value) == "arrays must have same length"
+
+
+def test_weeks_between_invalid_week():
+    with pytest.raises(ValueError) as e:
+        epi.weeks_between([2015], [99], [2015], [1])
+    assert str(e.value) == "week must be in 1..52 for year"
+    with pytest.raises(ValueError) as e:
+        epi.weeks_between([2015], [1], [2015], [0], "who")
+    assert str(e.value) == "week must be in 1..53 for year"
+
+
+class FakeClock:
+    def __init__(self, today):
+        self.today = today
+
+    def __call__(self):
+        return self.today
+
+
+def test_week_clock():
+    clock = FakeClock(date(2014, 12, 31))
+    rollovers = []
+    week_clock = epi.WeekClock(
+        clock=clock, on_rollover=lambda *weeks: rollovers.append(weeks)
+    )
+    week = week_clock.thisweek()
+    assert week == epi.Week(2014, 53)
+    assert week_clock.nextdate() == date(2015, 1, 4)
+    clock.today = date(2015, 1, 3)
+    assert week_clock.thisweek() is week
+    assert rollovers == []
+    clock.today = date(2015, 1, 4)
+    assert week_clock.thisweek() == epi.Week(2015, 1)
+    assert week_clock.thisweek() is week_clock.thisweek()
+    assert rollovers == [(epi.Week(2014, 53), epi.Week(2015, 1))]
+    assert week_clock.nextdate() == date(2015, 1, 11)
+
+
+def test_week_clock_moving_backward():
+    clock = FakeClock(date(2015, 1, 5))
+    rollovers = []
+    week_clock = epi.WeekClock(
+        "who", clock=clock, on_rollover=lambda *weeks: rollovers.append(weeks)
+    )
+    assert week_clock.thisweek() == epi.Week(2015, 2, "who")
+    clock.today = date(2015, 1, 4)
+    assert week_clock.thisweek() == epi.Week(2015, 1, "who")
+    assert rollovers == []
+    clock.today = date(2015, 1, 5)
+    assert week_clock.thisweek() == epi.Week(2015, 2, "who")
+    assert rollovers == [(epi.Week(2015, 1, "who"), epi.Week(2015, 2, "who"))]
+
+
+def test_week_clock_today():
+    week_clock = epi.WeekClock("who")
+    assert week_clock.__repr__() == "WeekClock(who)"
+    assert week_clock.thisweek() == epi.Week.thisweek("who")
+
+
+@pytest.mark.parametrize("test_input", ["cdc", "who"])
+def test_iter_days(test_input):
+    start, end = date(2014, 12, 24), date(2016, 1, 6)
+    days = list(epi.iter_days(start, end, test_input))
+    assert len(days) == (end - start).days + 1
+    for date_obj, week in days:
+        assert week == epi.Week.fromdate(date_obj, test_input)
+    assert days[0][0] == start
+    assert days[-1][0] == end
+    weeks = set(week for _, week in days)
+    assert len(set(id(week) for _, week in days)) == len(weeks)
+
+
+def test_iter_days_ordinals():
+    start, end = date(2014, 12, 27), date(2014, 12, 29)
+    assert list(epi.iter_days(start, end, ordinals=True)) == [
+        (735594, 2014, 52),
+        (735595, 2014, 53),
+        (735596, 2014, 53),
+    ]
+
+
+def test_iter_days_empty_range():
+    assert list(epi.iter_days(date(2015, 1, 2), date(2015, 1, 1))) == []
+
+
+def test_iter_days_arrays():
+    start, end = date(2014, 12, 1), date(2015, 2, 1)
+    chunks = list(epi.iter_days_arrays(start, end, "who", size=10))
+    assert [len(chunk[0]) for chunk in chunks] == [10] * 6 + [3]
+    days = list(epi.iter_days(start, end, "who", ordinals=True))
+    assert [day for chunk in chunks for day in zip(*chunk)] == days
+
+
+def test_iter_days_arrays_invalid_size():
+    with pytest.raises(ValueError) as e:
+        list(epi.iter_days_arrays(date(2015, 1, 1), date(2015, 1, 2), size=0))
+    assert str(e.value) == "size must be a positive integer"
+
+
+def test_series_rolling_with_inf():
+    nan, inf = float("nan"), float("inf")
+    series = epi.WeekSeries(epi.Week(2015, 1), [inf, 1, 1, 1, -inf, inf])
+    expected = [nan, inf, 2, 2, -inf, nan]
+    assert_series_equal(series.rolling_sum(2), epi.Week(2015, 1), expected)
+
+
+def test_series_rolling_with_large_values():
+    nan = float("nan")
+    series = epi.WeekSeries(epi.Week(2015, 1), [1e16, 1, 1, 1])
+    start = epi.Week(2015, 1)
+    assert_series_equal(series.rolling_sum(2), start, [nan, 1e16 + 1, 2, 2])
+    assert_series_equal(series.rolling_mean(2), start, [nan, 5e15, 1, 1])
+
+
+class LabeledWeek(epi.Week):
+    def __init__(self, year, week, label):
+        super(LabeledWeek, self).__init__(year, week)
+        self.label = label
+
+
+class LabeledYear(epi.Year):
+    pass
+
+
+def test_pickle_subclass():
+    import pickle
+
+    week = pickle.loads(pickle.dumps(LabeledWeek(2015, 52, "flu")))
+    assert type(week) is LabeledWeek
+    assert week.weektuple() == (2015, 52)
+    assert week.label == "flu"
+    year = pickle.loads(pickle.dumps(LabeledYear(2015, "who")))
+    assert type(year) is LabeledYear
+    assert repr(year) == "LabeledYear(2015, who)"
+
+
+@pytest.mark.parametrize("test_input", [201500, 201553, 201599, 1, 1000001])
+def test_loads_weeks_invalid_week(empty_caches, test_input):
+    import struct
+
+    epi.warmup([2015], ["cdc"])
+    data = b"EPIW\x01\x00\x00\x00" + struct.pack("<Ii", 1, test_input)
+    with pytest.raises(ValueError) as e:
+        epi.loads_weeks(data)
+    assert str(e.value) == "invalid weeks data"
+
+
+def test_unpickle_invalid_week():
+    with pytest.raises(ValueError) as e:
+        epi._unpack_week(201500 * 2)
+    assert str(e.value) == "invalid packed week"
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        ("shift_weeks", ([-1], [1], 1)),
+        ("shift_weeks", ([10000], [1], -1)),
+        ("weeks_between", ([-1], [1], [2015], [1])),
+        ("weeks_between", ([2015], [1], [0], [1])),
+    ],
+)
+def test_batch_weeks_invalid_year(test_input):
+    name, args = test_input
+    with pytest.raises(ValueError) as e:
+        getattr(epi, name)(*args)
+    assert str(e.value) == "year must be in 1..9999"
+
+
+@pytest.mark.parametrize("test_input", [-1, 0, 10001])
+def test_year_start_out_of_range(test_input):
+    with pytest.raises(ValueError) as e:
+        epi._year_start(test_input, "cdc")
+    assert str(e.value) == "year {} is out of range".format(test_input)
+
+
+def test_iter_days_mixed_case_method():
+    start, end = date(2014, 12, 29), date(2015, 1, 4)
+    days = list(epi.iter_days(start, end, "WHO"))
+    assert all(week.method == "who" for _, week in days)
+    assert days[0][1] == epi.Week(2015, 1, "who")
+    chunks = list(epi.iter_days_arrays(start, end, "Who"))
+    assert list(chunks[0][2]) == [1] * 7
+
+
+@pytest.mark.parametrize(
+    "test_input, expected",
+    [
+        (("iter_days", "mmwr"), "method must be 'cdc' or 'who'"),
+        (("iter_days_arrays", "mmwr"), "method must be 'cdc' or 'who'"),
+    ],
+)
+def test_iter_days_invalid_method_eagerly(test_input, expected):
+    name, method = test_input
+    with pytest.raises(ValueError) as e:
+        getattr(epi, name)(date(2015, 1, 1), date(2015, 1, 2), method)
+    assert str(e.value) == expected
+
+
+def test_iter_days_arrays_invalid_size_eagerly():
+    with pytest.raises(ValueError):
+        epi.iter_days_arrays(date(2015, 1, 1), date(2015, 1, 2), size=0)
+
+
+def test_series_rolling_with_overflow():
+    nan, inf = float("nan"), float("inf")
+    series = epi.WeekSeries(epi.Week(2015, 1), [1e308, 1e308, 1.0, -1e308])
+    expected = [nan, inf, 1e308, -1e308 + 1]
+    assert_series_equal(series.rolling_sum(2), epi.Week(2015, 1), expected)
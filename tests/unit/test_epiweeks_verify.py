@@ -0,0 +1,77 @@
+import pytest
+from datetime import date, timedelta
+import epiweeks
+import epiweeks_verify
+
+
+@pytest.mark.parametrize("test_input", [(1, 3), (2014, 2018), (9997, 9999)])
+def test_verify(test_input):
+    assert epiweeks_verify.verify(*test_input, processes=1) == []
+
+
+def test_verify_detects_mismatch(monkeypatch):
+    def broken_keys(first_year, last_year):
+        scalar_keys = epiweeks_verify._scalar_fromdate_keys
+        keys_by_method = scalar_keys(first_year, last_year)
+        for keys in keys_by_method.values():
+            keys[3] += 1
+        return keys_by_method
+
+    def broken_starts(year, method):
+        return epiweeks_verify._scalar_week_starts(year, method)[:-1]
+
+    fromdate_engines = epiweeks_verify._FROMDATE_ENGINES
+    startdate_engines = epiweeks_verify._STARTDATE_ENGINES
+    monkeypatch.setitem(fromdate_engines, "broken", broken_keys)
+    monkeypatch.setitem(startdate_engines, "broken", broken_starts)
+    mismatches = epiweeks_verify.verify(2015, 2015, processes=1)
+    assert [m[:3] for m in mismatches] == [
+        ("fromdate", "broken", "cdc"),
+        ("startdate", "broken", "cdc"),
+        ("fromdate", "broken", "who"),
+        ("startdate", "broken", "who"),
+    ]
+    assert mismatches[0][3] == date(2015, 1, 4)
+    assert mismatches[1][3].weektuple() == (2015, 52)
+
+
+def test_reference_epiweek_matches_iso_calendar():
+    for day in range(800):
+        date_obj = date(2014, 6, 1) + timedelta(days=day)
+        year, week = date_obj.isocalendar()[:2]
+        key = epiweeks_verify._reference_epiweek(date_obj.toordinal(), "who")
+        assert key == year * 100 + week
+
+
+def test_verify_detects_shift_mismatch(monkeypatch):
+    def broken_shift_weeks(years, weeks, k, method="cdc"):
+        years, weeks = epiweeks.shift_weeks(years, weeks, k, method)
+        if k == 52:
+            weeks[0] += 1
+        return years, weeks
+
+    monkeypatch.setattr(epiweeks_verify, "shift_weeks", broken_shift_weeks)
+    mismatches = epiweeks_verify.verify(2015, 2016, processes=1)
+    assert [m[:3] for m in mismatches] == [
+        ("shift", "shift_weeks", "cdc"),
+        ("shift", "shift_weeks", "who"),
+    ]
+    week, k = mismatches[0][3]
+    assert week.weektuple() == (2015, 1)
+    assert k == 52
+
+
+
+def test_verify_detects_index_mismatch(monkeypatch):
+    def broken_week_from_index(index, method):
+        return epiweeks._week_from_index(index + 1, method)
+
+    monkeypatch.setattr(
+        epiweeks_verify, "_week_from_index", broken_week_from_index
+    )
+    mismatches = epiweeks_verify.verify(2015, 2015, processes=1)
+    assert [m[:3] for m in mismatches] == [
+        ("startdate", "index", "cdc"),
+        ("startdate", "index", "who"),
+    ]
+    assert mismatches[0][3].weektuple() == (2015, 1)